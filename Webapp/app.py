@@ -1,8 +1,9 @@
-from flask import Flask, render_template, request, session, redirect, url_for, jsonify
+from flask import Flask, Response, render_template, request, session, redirect, url_for
+from flask_compress import Compress
 import logging
-import datetime
-from functools import wraps
-from utils import predict_stroke
+from functools import wraps, lru_cache
+from utils import predict_stroke, result_to_json
+from forms import StrokeForm
 from database import (
     create_user, verify_user, get_user_by_id, 
     save_prediction, get_user_predictions, get_user_stats
@@ -13,8 +14,38 @@ app = Flask(__name__)
 # Use environment variable if available, otherwise use default for development
 app.secret_key = os.environ.get('SECRET_KEY', 'sk_dev_local_testing_key_not_for_production')
 
+# Templates don't change while the app runs: skip the per-render mtime check
+# and compile them all up front (shared by Gunicorn workers via preload)
+app.config['TEMPLATES_AUTO_RELOAD'] = False
+app.jinja_env.auto_reload = False
+for _template in app.jinja_env.list_templates():
+    app.jinja_env.get_template(_template)
+
+# Compress HTML/CSS/JS responses (Brotli, falling back to gzip)
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+Compress(app)
+
+# Let browsers cache static files for a year; URLs carry a ?v=<mtime>
+# version (see static_cache_buster) so changed files are still fetched
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 31536000
+
+@lru_cache(maxsize=None)
+def _static_version(filename):
+    """Modification time of a static file, used as its cache-busting version"""
+    return int(os.path.getmtime(os.path.join(app.static_folder, filename)))
+
+@app.url_defaults
+def static_cache_buster(endpoint, values):
+    """Add ?v=<mtime> to url_for('static', ...) URLs"""
+    if endpoint == 'static' and 'filename' in values:
+        try:
+            values['v'] = _static_version(values['filename'])
+        except OSError:
+            pass
+
 # Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
 # Login required decorator
 def login_required(f):
@@ -25,6 +56,18 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def _json_response(body, status=200):
+    return Response(result_to_json(body), status=status, mimetype='application/json')
+
+# API variant: JSON clients get a 401 instead of a redirect to the login page
+def api_login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return _json_response({'error': 'Login required'}, status=401)
+        return f(*args, **kwargs)
+    return decorated_function
+
 @app.route('/')
 def home():
     """Landing page - redirect based on login status"""
@@ -53,7 +96,7 @@ def register():
         success, result = create_user(username, email, password, full_name)
         
         if success:
-            logging.info(f"New user registered: {username}")
+            logger.info("New user registered: %s", username)
             return redirect(url_for('login'))
         else:
             return render_template('register.html', error=result)
@@ -72,7 +115,7 @@ def login():
         if success:
             session['user_id'] = user['id']
             session['username'] = user['username']
-            logging.info(f"User logged in: {username}")
+            logger.info("User logged in: %s", username)
             return redirect(url_for('dashboard'))
         else:
             return render_template('login.html', error='Invalid username or password')
@@ -84,7 +127,7 @@ def logout():
     """User logout"""
     username = session.get('username', 'Unknown')
     session.clear()
-    logging.info(f"User logged out: {username}")
+    logger.info("User logged out: %s", username)
     return redirect(url_for('login'))
 
 @app.route('/dashboard')
@@ -110,50 +153,23 @@ def history():
     predictions = get_user_predictions(session['user_id'], limit=20)
     return render_template('history.html', user=user, predictions=predictions)
 
+def _build_input_vector(form):
+    """Parse the assessment form into the model input list (raises ValueError)"""
+    input_data = StrokeForm.from_form(form).to_vector()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Final User Input (Correct & Safe): %s", input_data)
+    return input_data
+
 @app.route('/predict', methods=['POST'])
 @login_required
 def predict():
     try:
-        # Safe categorical encoding (accepts numbers OR text)
-        def encode(value, mapping):
-            value = str(value)
-            if value.isdigit():
-                return int(value)
-            return mapping[value]
-
-        category_map = {
-            "gender": {"Male": 1, "Female": 0},
-            "ever_married": {"Yes": 1, "No": 0},
-            "work_type": {"Govt Job": 0, "Private": 1, "Self-employed": 2, "Children": 3},
-            "Residence_type": {"Rural": 0, "Urban": 1},
-            "smoking_status": {"Unknown": 0, "Formerly Smoked": 1, "Never Smoked": 2, "Smokes": 3},
-        }
-
-        # Handle BMI - use mean if not provided
-        bmi_value = request.form.get("bmi", "").strip()
-        if bmi_value == "" or bmi_value is None:
-            # Use the mean BMI from training data (28.893237)
-            bmi_value = 28.89
-            logging.info(f"⚠️ BMI not provided, using mean value: {bmi_value}")
-        else:
-            bmi_value = float(bmi_value)
-
-        # EXACT TRAINING FEATURE ORDER
-        input_data = [
-            encode(request.form["gender"], category_map["gender"]),                 # gender
-            float(request.form["age"]),                                             # age
-            float(request.form["hypertension"]),                                    # hypertension
-            float(request.form["heart_disease"]),                                   # heart_disease
-            encode(request.form["ever_married"], category_map["ever_married"]),     # ever_married
-            encode(request.form["work_type"], category_map["work_type"]),           # work_type
-            encode(request.form["Residence_type"], category_map["Residence_type"]), # Residence_type
-            float(request.form["avg_glucose_level"]),                               # avg_glucose_level
-            bmi_value,                                                              # bmi (with default handling)
-            encode(request.form["smoking_status"], category_map["smoking_status"])  # smoking_status
-        ]
-
-        logging.info(f"Final User Input (Correct & Safe): {input_data}")
+        input_data = _build_input_vector(request.form)
+    except ValueError as e:
+        logger.error("Invalid input: %s", e)
+        return render_template("error.html", error=str(e))
 
+    try:
         result = predict_stroke(input_data)
         
         # Save prediction to history
@@ -174,10 +190,25 @@ def predict():
                              user=user)
 
     except Exception as e:
-        logging.error(f"Unexpected error: {e}")
+        logger.error("Unexpected error: %s", e)
         return render_template("error.html", error=str(e))
 
-import os
+@app.route('/api/predict', methods=['POST'])
+@api_login_required
+def api_predict():
+    """Same as /predict (same form fields), but returns the result as JSON"""
+    try:
+        input_data = _build_input_vector(request.form)
+    except ValueError as e:
+        logger.error("Invalid input: %s", e)
+        return _json_response({'error': str(e)}, status=400)
+
+    result = predict_stroke(input_data)
+    if result['prediction'] == -1:
+        return _json_response({'error': 'Prediction failed, please try again'}, status=500)
+
+    save_prediction(session['user_id'], input_data, result['prediction'], result['probability'])
+    return _json_response(result)
 
 if __name__ == "__main__":
     # Render assigns a dynamic port; this line captures it
@@ -0,0 +1,37 @@
+"""
+Convert the production model to ONNX for faster serving
+The graph takes scaled features as float32: utils.py scales in float64 (like
+scaler.transform) and casts afterwards, because scaling in float32 inside the
+graph can move a row across a tree split
+Run from the Webapp folder after retraining: python convert_model.py
+Requires: pip install skl2onnx onnxruntime
+"""
+import os
+import joblib
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODEL_PATH = os.path.join(BASE_DIR, "Models", "stroke_model.pkl")
+ONNX_PATH = os.path.join(BASE_DIR, "Models", "stroke_model.onnx")
+
+
+def convert():
+    model = joblib.load(MODEL_PATH)
+
+    onnx_model = convert_sklearn(
+        model,
+        initial_types=[("input", FloatTensorType([None, model.n_features_in_]))],
+        # Plain probability tensor instead of a list of {class: proba} dicts
+        options={id(model): {"zipmap": False}},
+    )
+
+    with open(ONNX_PATH, "wb") as f:
+        f.write(onnx_model.SerializeToString())
+
+    print(f"✓ ONNX model written to {ONNX_PATH}")
+
+
+if __name__ == "__main__":
+    convert()
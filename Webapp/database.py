@@ -4,15 +4,75 @@ Uses SQLite for simplicity and reliability
 """
 import sqlite3
 import hashlib
+import hmac
+import logging
 import os
+import queue
+import threading
+import time
+import atexit
 from datetime import datetime
+from cachetools import TTLCache, cached
 
 DB_PATH = os.path.join(os.path.dirname(__file__), 'stroke_app.db')
 
+logger = logging.getLogger(__name__)
+
+# Server-side pepper for password hashes; set PW_PEPPER in production.
+# Changing it invalidates every stored password hash.
+# BLAKE2b keys are limited to 64 bytes, so longer peppers are hashed down.
+if 'PW_PEPPER' not in os.environ:
+    logger.warning("PW_PEPPER is not set: password hashes use the public development "
+                   "pepper 'dev'. Set PW_PEPPER to a long random secret in production.")
+PASSWORD_PEPPER = os.environ.get('PW_PEPPER', 'dev').encode()
+if len(PASSWORD_PEPPER) > hashlib.blake2b.MAX_KEY_SIZE:
+    PASSWORD_PEPPER = hashlib.blake2b(PASSWORD_PEPPER).digest()
+
+# get_user_by_id runs on almost every page; account details rarely change
+_user_cache = TTLCache(maxsize=1024, ttl=60)
+_user_cache_lock = threading.Lock()
+
+# Recently failed (username, password hash) logins, so repeated identical
+# attempts (e.g. credential stuffing retries) don't reach SQLite
+_failed_login_cache = TTLCache(maxsize=1024, ttl=1.0)
+_failed_login_lock = threading.Lock()
+
+# One connection per thread, opened on first use and kept for its lifetime
+_local = threading.local()
+
+# Predictions are queued by save_prediction and written in batches by a
+# background thread, keeping the INSERT/COMMIT off the /predict response
+FLUSH_INTERVAL = 0.05  # seconds
+_pred_queue = queue.Queue()
+_pred_pending = threading.Event()
+_pred_write_lock = threading.Lock()
+_writer_thread = None
+
+def _reset_after_fork():
+    """Forked workers must not share the parent's connections or writer state"""
+    global _local, _pred_queue, _pred_pending, _pred_write_lock, _writer_thread
+    _local = threading.local()
+    _pred_queue = queue.Queue()
+    _pred_pending = threading.Event()
+    _pred_write_lock = threading.Lock()
+    _writer_thread = None
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
 def get_db_connection():
-    """Create database connection"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """Get this thread's database connection (created on first use)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        # WAL lets readers run while save_prediction writes
+        conn.executescript('''
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA mmap_size=268435456;
+        ''')
+        _local.conn = conn
     return conn
 
 def init_db():
@@ -51,30 +111,38 @@ def init_db():
         )
     ''')
     
+    # History is always read per user, newest first; this index also
+    # covers the user_id filter in get_user_stats
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pred_user_date
+        ON predictions (user_id, prediction_date DESC)
+    ''')
+    
     conn.commit()
-    conn.close()
     print("✓ Database initialized successfully")
 
 def hash_password(password):
-    """Hash password using SHA-256"""
+    """Hash password using BLAKE2b keyed with the server pepper"""
+    return hashlib.blake2b(password.encode(), key=PASSWORD_PEPPER, digest_size=32).hexdigest()
+
+def legacy_hash_password(password):
+    """Unkeyed SHA-256 hash used by older accounts (upgraded on next login)"""
     return hashlib.sha256(password.encode()).hexdigest()
 
 def create_user(username, email, password, full_name):
     """Create new user account"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
         
         password_hash = hash_password(password)
         
-        cursor.execute('''
-            INSERT INTO users (username, email, password_hash, full_name)
-            VALUES (?, ?, ?, ?)
-        ''', (username, email, password_hash, full_name))
+        with conn:
+            cursor = conn.execute('''
+                INSERT INTO users (username, email, password_hash, full_name)
+                VALUES (?, ?, ?, ?)
+            ''', (username, email, password_hash, full_name))
         
-        conn.commit()
         user_id = cursor.lastrowid
-        conn.close()
         return True, user_id
     except sqlite3.IntegrityError:
         return False, "Username or email already exists"
@@ -83,26 +151,48 @@ def create_user(username, email, password, full_name):
 
 def verify_user(username, password):
     """Verify user credentials"""
+    password_hash = hash_password(password)
+    
+    attempt = (username, password_hash)
+    with _failed_login_lock:
+        if attempt in _failed_login_cache:
+            return False, None
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    password_hash = hash_password(password)
-    
     cursor.execute('''
-        SELECT id, username, email, full_name
+        SELECT id, username, email, full_name, password_hash
         FROM users
-        WHERE username = ? AND password_hash = ?
-    ''', (username, password_hash))
+        WHERE username = ?
+    ''', (username,))
     
     user = cursor.fetchone()
-    conn.close()
     
-    if user:
-        return True, dict(user)
-    return False, None
+    # Constant-time comparisons so response time doesn't leak hash prefixes
+    is_current = user is not None and hmac.compare_digest(user['password_hash'], password_hash)
+    is_legacy = (user is not None and not is_current and
+                 hmac.compare_digest(user['password_hash'], legacy_hash_password(password)))
+    
+    if not (is_current or is_legacy):
+        with _failed_login_lock:
+            _failed_login_cache[attempt] = True
+        return False, None
+    
+    # Backfill the new hash for accounts created before the switch
+    if is_legacy:
+        with conn:
+            conn.execute('''
+                UPDATE users SET password_hash = ? WHERE id = ?
+            ''', (password_hash, user['id']))
+    
+    user = dict(user)
+    del user['password_hash']
+    return True, user
 
+@cached(_user_cache, lock=_user_cache_lock)
 def get_user_by_id(user_id):
-    """Get user information by ID"""
+    """Get user information by ID (cached for 60 seconds)"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -113,27 +203,18 @@ def get_user_by_id(user_id):
     ''', (user_id,))
     
     user = cursor.fetchone()
-    conn.close()
     
     return dict(user) if user else None
 
 def save_prediction(user_id, input_data, prediction_result, probability):
-    """Save prediction to history"""
+    """Queue prediction for the background history writer"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # input_data order: gender, age, hypertension, heart_disease, ever_married, 
         #                   work_type, Residence_type, avg_glucose_level, bmi, smoking_status
         gender_map = {0: 'Female', 1: 'Male'}
         smoking_map = {0: 'Unknown', 1: 'Formerly Smoked', 2: 'Never Smoked', 3: 'Currently Smokes'}
         
-        cursor.execute('''
-            INSERT INTO predictions (
-                user_id, age, gender, hypertension, heart_disease,
-                avg_glucose_level, bmi, smoking_status, prediction_result, probability
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        row = (
             user_id,
             int(input_data[1]),  # age
             gender_map.get(input_data[0], 'Unknown'),  # gender
@@ -144,17 +225,64 @@ def save_prediction(user_id, input_data, prediction_result, probability):
             smoking_map.get(input_data[9], 'Unknown'),  # smoking_status
             prediction_result,
             probability
-        ))
-        
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        print(f"Error saving prediction: {e}")
+        )
+    except Exception:
+        logger.exception("Error saving prediction")
         return False
+    
+    _start_writer()
+    _pred_queue.put(row)
+    _pred_pending.set()
+    return True
+
+def flush_predictions():
+    """Write all queued predictions in one transaction"""
+    with _pred_write_lock:
+        rows = []
+        while True:
+            try:
+                rows.append(_pred_queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        if not rows:
+            return
+        
+        try:
+            conn = get_db_connection()
+            with conn:
+                conn.executemany('''
+                    INSERT INTO predictions (
+                        user_id, age, gender, hypertension, heart_disease,
+                        avg_glucose_level, bmi, smoking_status, prediction_result, probability
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+        except Exception:
+            logger.exception("Error saving %d prediction(s)", len(rows))
+
+def _flush_loop():
+    while True:
+        _pred_pending.wait()
+        time.sleep(FLUSH_INTERVAL)  # let concurrent requests join the batch
+        _pred_pending.clear()
+        flush_predictions()
+
+def _start_writer():
+    """Start the writer thread on first use (once per forked worker)"""
+    global _writer_thread
+    if _writer_thread is not None:
+        return
+    with _pred_write_lock:
+        if _writer_thread is None:
+            _writer_thread = threading.Thread(target=_flush_loop, daemon=True)
+            _writer_thread.start()
+
+# Don't lose queued rows on shutdown
+atexit.register(flush_predictions)
 
 def get_user_predictions(user_id, limit=10):
     """Get user's prediction history"""
+    flush_predictions()  # include this process's not-yet-written predictions
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -168,12 +296,12 @@ def get_user_predictions(user_id, limit=10):
     ''', (user_id, limit))
     
     predictions = cursor.fetchall()
-    conn.close()
     
     return [dict(pred) for pred in predictions]
 
 def get_user_stats(user_id):
     """Get user statistics"""
+    flush_predictions()
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -188,7 +316,6 @@ def get_user_stats(user_id):
     ''', (user_id,))
     
     stats = cursor.fetchone()
-    conn.close()
     
     return dict(stats) if stats else None
 
@@ -0,0 +1,86 @@
+"""
+Assessment form parsing for /predict
+Turns submitted form values into the model input vector (training feature order)
+"""
+import math
+
+# Categorical encoding: (field, submitted value) -> training code.
+# Accepts the numeric codes sent by the form as well as the text labels.
+CATEGORY_MAP = {
+    "gender": {"Male": 1, "Female": 0},
+    "ever_married": {"Yes": 1, "No": 0},
+    "work_type": {"Govt Job": 0, "Private": 1, "Self-employed": 2, "Children": 3},
+    "Residence_type": {"Rural": 0, "Urban": 1},
+    "smoking_status": {"Unknown": 0, "Formerly Smoked": 1, "Never Smoked": 2, "Smokes": 3},
+}
+DIGIT_SHORTCUT = {str(i): i for i in range(4)}
+
+# Mean BMI from training data (28.893237), used when BMI is left blank
+BMI_MEAN = 28.89
+
+_ENCODE = {}
+for _field, _mapping in CATEGORY_MAP.items():
+    for _label, _code in _mapping.items():
+        _ENCODE[(_field, _label)] = _code
+    for _digit, _code in DIGIT_SHORTCUT.items():
+        _ENCODE[(_field, _digit)] = _code
+
+
+def _category(field):
+    """Build the parser for one categorical field"""
+    def parse(value):
+        return _ENCODE[(field, value)]
+    return parse
+
+
+def _number(value):
+    """A finite, non-negative number (rejects "nan", "inf" and negatives)"""
+    number = float(value)
+    if not math.isfinite(number) or number < 0:
+        raise ValueError(value)
+    return number
+
+
+def _bmi(value):
+    """BMI is optional - use the training mean when left blank"""
+    value = (value or "").strip()
+    return _number(value) if value else BMI_MEAN
+
+
+# EXACT TRAINING FEATURE ORDER: (field name, parser)
+_FIELDS = (
+    ("gender", _category("gender")),
+    ("age", _number),
+    ("hypertension", _number),
+    ("heart_disease", _number),
+    ("ever_married", _category("ever_married")),
+    ("work_type", _category("work_type")),
+    ("Residence_type", _category("Residence_type")),
+    ("avg_glucose_level", _number),
+    ("bmi", _bmi),
+    ("smoking_status", _category("smoking_status")),
+)
+
+
+class StrokeForm:
+    """Validated assessment input, one slot per training feature"""
+
+    __slots__ = tuple(name for name, _ in _FIELDS)
+
+    @classmethod
+    def from_form(cls, form):
+        """
+        Parse a submitted form (request.form or any mapping)
+        Raises ValueError naming the first missing or invalid field
+        """
+        self = cls.__new__(cls)
+        for name, parse in _FIELDS:
+            try:
+                setattr(self, name, parse(form.get(name)))
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Invalid input for {name}: {form.get(name)!r}") from None
+        return self
+
+    def to_vector(self):
+        """Model input list in training feature order"""
+        return [getattr(self, name) for name in self.__slots__]
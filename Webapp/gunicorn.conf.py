@@ -0,0 +1,19 @@
+"""
+Gunicorn configuration (picked up automatically when started from Webapp/)
+
+The model and scaler are loaded by utils.py at import time. With preload_app
+the master imports the app once and the forked workers share those pages
+copy-on-write instead of each unpickling their own copy.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+preload_app = True
+timeout = 30
+
+# Set GUNICORN_THREADS > 1 to serve several requests per worker; combine with
+# PREDICT_BATCH_WINDOW_MS (see utils.py) to batch their model calls
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+worker_class = "gthread" if threads > 1 else "sync"
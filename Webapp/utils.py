@@ -1,14 +1,48 @@
 import os
+
+# Single-row predictions are faster single-threaded: OpenMP/BLAS thread pool
+# dispatch costs more than it saves. Must be set before numpy/sklearn load.
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+import math
+import queue
+import threading
+import time
+from bisect import bisect_right
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import NamedTuple, Sequence
 import joblib
 import numpy as np
-import pandas as pd
 import logging
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+
+# Optional: serve the model through ONNX Runtime (see convert_model.py)
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+# Optional: faster JSON encoding for the /api/predict response
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    import json
 
 # ---------------- LOGGING ----------------
+# No %(asctime)s: Gunicorn/the platform log collector timestamps each line,
+# and records skip the thread/process lookups nothing here prints
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
+    format="%(levelname)s - %(message)s"
 )
+logger = logging.getLogger(__name__)
 
 # ---------------- PATH SETUP ----------------
 # utils.py is inside Webapp/
@@ -17,54 +51,328 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 MODEL_PATH = os.path.join(BASE_DIR, "Models", "stroke_model.pkl")
 SCALER_PATH = os.path.join(BASE_DIR, "Models", "scaler.pkl")
+ONNX_PATH = os.path.join(BASE_DIR, "Models", "stroke_model.onnx")
+
+# Feature order MUST match training exactly
+FEATURE_NAMES = (
+    'gender',
+    'age',
+    'hypertension',
+    'heart_disease',
+    'ever_married',
+    'work_type',
+    'Residence_type',
+    'avg_glucose_level',
+    'bmi',
+    'smoking_status'
+)
+
+def _scaler_ops(scaler):
+    """
+    The fitted scaler's transform as in-place (ufunc, float64 constants) steps,
+    in the same order sklearn applies them, so the result is bit-identical
+    """
+    if isinstance(scaler, StandardScaler):
+        ops = []
+        if scaler.with_mean:
+            ops.append((np.subtract, scaler.mean_))
+        if scaler.with_std:
+            ops.append((np.divide, scaler.scale_))
+    elif isinstance(scaler, MinMaxScaler):
+        ops = [(np.multiply, scaler.scale_), (np.add, scaler.min_)]
+        if scaler.clip:
+            low, high = scaler.feature_range
+            ops += [(np.maximum, low), (np.minimum, high)]
+    else:
+        raise TypeError(f"Unsupported scaler: {type(scaler).__name__}")
+    return tuple((op, np.array(constants, dtype=np.float64)) for op, constants in ops)
+
 
 # ---------------- LOAD MODEL & SCALER ----------------
 try:
-    model = joblib.load(MODEL_PATH)
-    scaler = joblib.load(SCALER_PATH)
-    logging.info("\nModel and scaler loaded successfully.")
+    # The pickles are stored uncompressed, so numpy arrays inside them are
+    # memory-mapped read-only instead of copied into each process
+    model = joblib.load(MODEL_PATH, mmap_mode='r')
+    scaler = joblib.load(SCALER_PATH, mmap_mode='r')
+
+    if list(getattr(scaler, "feature_names_in_", FEATURE_NAMES)) != list(FEATURE_NAMES):
+        raise ValueError("Scaler feature order does not match FEATURE_NAMES")
+
+    # Inputs are passed as plain arrays in FEATURE_NAMES order, so drop the
+    # fitted column names to skip sklearn's per-call feature name check
+    if hasattr(model, "feature_names_in_"):
+        del model.feature_names_in_
+
+    # Trained with n_jobs=-1; one row never benefits from a joblib pool
+    if hasattr(model, "n_jobs"):
+        model.n_jobs = 1
+
+    # Scaling is done by hand in preprocess_input, in float64 like
+    # scaler.transform, for every backend (sklearn, direct trees, ONNX):
+    # float32 rounding can flip a row across a tree split
+    _SCALER_OPS = _scaler_ops(scaler)
+
+    logger.info("\nModel and scaler loaded successfully.")
 
 except Exception as e:
-    logging.error(f"\nError loading model or scaler: {e}")
+    logger.error("\nError loading model or scaler: %s", e)
     model, scaler = None, None
 
+# ---------------- ONNX RUNTIME (OPTIONAL) ----------------
+# Used instead of model.predict_proba when Models/stroke_model.onnx exists
+# and onnxruntime is installed
+onnx_session = None
+if model is not None and ort is not None and os.path.exists(ONNX_PATH):
+    try:
+        if os.path.getmtime(ONNX_PATH) < max(os.path.getmtime(MODEL_PATH), os.path.getmtime(SCALER_PATH)):
+            raise ValueError("stroke_model.onnx is older than the pickles, re-run convert_model.py")
+
+        _sess_options = ort.SessionOptions()
+        # One request per worker thread; extra intra-op/inter-op threads only contend
+        _sess_options.intra_op_num_threads = 1
+        _sess_options.inter_op_num_threads = 1
+        _sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        _sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        onnx_session = ort.InferenceSession(
+            ONNX_PATH, _sess_options, providers=["CPUExecutionProvider"]
+        )
+        _ONNX_INPUT = onnx_session.get_inputs()[0].name
+        _ONNX_OUTPUTS = [onnx_session.get_outputs()[1].name]  # probabilities only
+
+        # Only trusted once it agrees with the sklearn model on scaled rows
+        # (catches e.g. an older export with the scaler inside the graph).
+        # The tolerance allows for the float32 tree sum, not exact agreement
+        _probe = np.random.default_rng(0).standard_normal((64, len(FEATURE_NAMES)))
+        _onnx_proba = onnx_session.run(_ONNX_OUTPUTS, {_ONNX_INPUT: _probe.astype(np.float32)})[0]
+        if not np.allclose(_onnx_proba, model.predict_proba(_probe), rtol=0, atol=1e-5):
+            raise ValueError("stroke_model.onnx does not match the model, re-run convert_model.py")
+        logger.info("\nONNX model loaded successfully.")
+
+    except Exception as e:
+        logger.error("\nError loading ONNX model, using sklearn: %s", e)
+        onnx_session = None
+
+
+# ---------------- DIRECT SKLEARN EVALUATION ----------------
+def _build_fast_predict_proba(model):
+    """
+    Evaluate the fitted estimator directly, skipping predict_proba's input
+    validation and joblib thread dispatch (which dominate for one row)
+    Returns None for unsupported model types
+    """
+    if isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)) and model.n_outputs_ == 1:
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        n_classes = len(model.classes_)
+
+        # Each tree's normalised node values (what its predict_proba returns
+        # for a row ending in that node), computed once and concatenated so a
+        # batch of rows is scored with one gather; offsets[i] is where tree
+        # i's nodes start
+        node_proba = []
+        for tree in trees:
+            values = tree.value[:, 0, :n_classes]
+            normalizer = values.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            node_proba.append(values / normalizer)
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])[:, None]
+        node_proba = np.concatenate(node_proba)
+
+        def fast_predict_proba(X):
+            X = np.ascontiguousarray(X, dtype=np.float32)
+            leaves = np.stack([tree.apply(X) for tree in trees])
+            leaves += offsets
+            # Same as the forest: average of each tree's normalised leaf values
+            proba = node_proba[leaves].sum(axis=0)
+            proba /= len(trees)
+            return proba
+
+        return fast_predict_proba
+
+    if isinstance(model, LogisticRegression) and len(model.classes_) == 2:
+        weights = model.coef_[0].astype(np.float64)
+        bias = float(model.intercept_[0])
+
+        def fast_predict_proba(X):
+            positive = 1.0 / (1.0 + np.exp(-(X @ weights + bias)))
+            return np.column_stack((1.0 - positive, positive))
+
+        return fast_predict_proba
+
+    return None
+
+
+_fast_predict_proba = None
+if model is not None:
+    try:
+        _fast_predict_proba = _build_fast_predict_proba(model)
+        if _fast_predict_proba is not None:
+            # Only trusted once it agrees with the sklearn wrapper
+            _probe = np.random.default_rng(0).standard_normal((64, len(FEATURE_NAMES))).astype(np.float32)
+            if not np.allclose(_fast_predict_proba(_probe), model.predict_proba(_probe)):
+                raise ValueError("direct evaluation does not match predict_proba")
+            logger.info("\nUsing direct %s evaluation.", type(model).__name__)
+
+    except Exception as e:
+        logger.error("\nDirect model evaluation disabled, using predict_proba: %s", e)
+        _fast_predict_proba = None
+
+
+def model_input(data):
+    """
+    Input row for model_predict_proba: scaled in float64 like scaler.transform,
+    then cast to float32 for the ONNX model (the trees cast the same way)
+    The returned array is reused by the next call on the same thread
+    """
+    scaled_data = preprocess_input(data)
+    if onnx_session is not None:
+        onnx_row = _scratch("onnx", np.float32)
+        onnx_row[...] = scaled_data
+        return onnx_row
+    return scaled_data
+
+
+def model_input_batch(rows):
+    """model_input for a sequence of input rows, as one (n_rows, n_features) array"""
+    X = np.array(rows, dtype=np.float64)
+    _apply_scaler(X)
+    if onnx_session is not None:
+        return X.astype(np.float32)
+    return X
+
+
+def model_predict_proba(X):
+    """Class probabilities for rows built by model_input"""
+    if onnx_session is not None:
+        # ONNX Runtime sums the trees in float32: within ~1e-6 of sklearn's
+        # float64 average, so a percentage can differ in its last displayed
+        # digit (e.g. 81.7% where sklearn shows 81.8%)
+        return onnx_session.run(_ONNX_OUTPUTS, {_ONNX_INPUT: X})[0]
+    if _fast_predict_proba is not None:
+        return _fast_predict_proba(X)
+    return model.predict_proba(X)
+
+
+# Per-thread scratch buffers (scaled row, its float32 ONNX copy) reused across requests
+_TLS = threading.local()
+
+
+# ---------------- MICRO-BATCHING ----------------
+# Set PREDICT_BATCH_WINDOW_MS (e.g. 5) to coalesce concurrent requests into a
+# single predict_proba call. Only useful with threaded Gunicorn workers
+# (GUNICORN_THREADS > 1); a sync worker never has two requests in flight.
+BATCH_WINDOW_MS = float(os.environ.get("PREDICT_BATCH_WINDOW_MS", 0))
+BATCH_MAX_SIZE = int(os.environ.get("PREDICT_BATCH_MAX_SIZE", 32))
+
+
+class PredictionBatcher:
+    """
+    Collects scaled rows from request threads and runs them through the
+    model in one call per batching window
+    """
+
+    def __init__(self, predict_fn, window_ms, max_size):
+        self._predict_fn = predict_fn
+        self._window = window_ms / 1000.0
+        self._max_size = max_size
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, row):
+        """Queue one (1, n_features) row and block until its result is ready"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((row, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        # Started lazily so every forked Gunicorn worker runs its own thread
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self._window
+            while len(items) < self._max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                results = self._predict_fn(np.vstack([row for row, _ in items]))
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(items, results):
+                future.set_result(result)
+
+
+_batcher = None
+if model is not None and BATCH_WINDOW_MS > 0:
+    _batcher = PredictionBatcher(model_predict_proba, BATCH_WINDOW_MS, BATCH_MAX_SIZE)
+    logger.info("\nPrediction batching enabled (%s ms window, max %s)", BATCH_WINDOW_MS, BATCH_MAX_SIZE)
+
 
 # ---------------- PREPROCESS INPUT ----------------
+def _scratch(name, dtype=np.float64):
+    """This thread's (1, n_features) buffer called `name`"""
+    buf = getattr(_TLS, name, None)
+    if buf is None:
+        buf = np.empty((1, len(FEATURE_NAMES)), dtype=dtype)
+        setattr(_TLS, name, buf)
+    return buf
+
+
+def _apply_scaler(X):
+    """Scale a float64 (n_rows, n_features) array in place, as scaler.transform would"""
+    for op, constants in _SCALER_OPS:
+        op(X, constants, out=X)
+
+
 def preprocess_input(data):
     """
     Preprocess input data with correct feature order and scaling
     Feature order MUST match training exactly
+    The returned array is reused by the next call on the same thread
     """
     try:
         if scaler is None:
             raise ValueError("\nScaler not loaded!")
 
-        feature_names = [
-            'gender',
-            'age',
-            'hypertension',
-            'heart_disease',
-            'ever_married',
-            'work_type',
-            'Residence_type',
-            'avg_glucose_level',
-            'bmi',
-            'smoking_status'
-        ]
-
-        # Convert input list to DataFrame
-        data_df = pd.DataFrame([data], columns=feature_names)
-
-        # Apply same scaler used during training
-        scaled_data = scaler.transform(data_df)
+        # Same scaler transform used during training, without the
+        # DataFrame round-trip and sklearn input validation
+        scaled_data = _scratch("scaled")
+        scaled_data[0] = data
+        _apply_scaler(scaled_data)
 
         return scaled_data
 
     except Exception as e:
-        logging.error(f"\nError in preprocessing: {e}")
+        logger.error("\nError in preprocessing: %s", e)
         raise
 
 
+# ---------------- WARM-UP ----------------
+# One dummy prediction at import pays the first-call costs (thread pools,
+# lazy imports, ONNX Runtime initialisation) before the first real request
+if model is not None:
+    try:
+        model_predict_proba(model_input([0.0] * len(FEATURE_NAMES)))
+    except Exception as e:
+        logger.error("\nModel warm-up failed: %s", e)
+
+
 # ---------------- PREDICTION ----------------
 def predict_stroke(input_data):
     """
@@ -75,305 +383,424 @@ def predict_stroke(input_data):
         if model is None:
             raise ValueError("\nModel not loaded!")
 
-        # Preprocess input
-        processed_data = preprocess_input(input_data)
-
-        # Get probability for stroke class (class = 1)
-        proba = model.predict_proba(processed_data)[0][1]
-        
-        # Calculate manual risk score as a safety check
-        manual_risk_score = calculate_manual_risk_score(input_data)
-        
-        # Adjust probability if manual risk score suggests higher risk
-        # This helps when the model underestimates risk
-        if manual_risk_score > proba:
-            logging.info(f"\nManual risk score ({manual_risk_score:.3f}) higher than model ({proba:.3f})")
-            proba = (proba + manual_risk_score) / 2  # Average them
-            logging.info(f"\nAdjusted probability to: {proba:.3f}")
-        
-        probability_percent = round(proba * 100, 2)
-
-        # Medical-safe threshold
-        prediction = 1 if proba >= 0.3 else 0
-
-        # Generate risk factors explanation
-        reasons = generate_risk_factors(input_data, proba)
-        
-        # Generate personalized recommendations
-        recommendations = generate_recommendations(input_data, proba)
-
-        logging.info(f"\nStroke probability: {proba:.3f}")
-        logging.info(f"\nFinal prediction (0=Low, 1=High): {prediction}")
-
-        return {
-            'prediction': prediction,
-            'probability': probability_percent,
-            'reasons': reasons,
-            'recommendations': recommendations
-        }
+        return _result_dict(_predict_cached(_input_key(input_data)))
+
+    except Exception as e:
+        logger.error("\nPrediction error: %s", e)
+        return _error_result()
+
+
+def result_to_json(result):
+    """Encode a predict_stroke result as UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(result)
+    return json.dumps(result, ensure_ascii=False).encode()
+
+
+def predict_stroke_batch(inputs):
+    """
+    predict_stroke for many inputs (e.g. a bulk upload), with one model call
+    for all rows instead of one per row. Results are not cached
+    Returns: list of dicts, one per input row, in order; a row that can't
+    be scored gets predict_stroke's error result without failing the others
+    """
+    inputs = list(inputs)
+    results = [None] * len(inputs)
+
+    # Validate each row on its own; only valid rows go to the model
+    keys, positions = [], []
+    for i, input_data in enumerate(inputs):
+        try:
+            keys.append(_input_key(input_data))
+            positions.append(i)
+        except Exception as e:
+            logger.error("\nBatch prediction error (row %d): %s", i, e)
+            results[i] = _error_result()
+
+    if not keys:
+        return results
 
+    try:
+        if model is None:
+            raise ValueError("\nModel not loaded!")
+        probas = model_predict_proba(model_input_batch(keys))[:, 1]
     except Exception as e:
-        logging.error(f"\nPrediction error: {e}")
-        return {
-            'prediction': -1,
-            'probability': 0,
-            'reasons': ['Error in prediction'],
-            'recommendations': ['Please try again or contact support']
-        }
+        logger.error("\nBatch prediction error: %s", e)
+        for i in positions:
+            results[i] = _error_result()
+        return results
+
+    for i, key, proba in zip(positions, keys, probas):
+        try:
+            results[i] = _result_dict(_explain(key, proba))
+        except Exception as e:
+            logger.error("\nBatch prediction error (row %d): %s", i, e)
+            results[i] = _error_result()
+
+    return results
+
+
+def _input_key(input_data):
+    """
+    The one conversion of an input row: a tuple of the exact floats.
+    Repeated assessments (e.g. re-submitting the same form) hit the cache,
+    but the cache never changes what the model and explanations see
+    """
+    key = tuple(float(v) for v in input_data)
+    if len(key) != len(FEATURE_NAMES):
+        raise ValueError(f"Expected {len(FEATURE_NAMES)} input values, got {len(key)}")
+    if not all(map(math.isfinite, key)):
+        raise ValueError(f"Input values must be finite numbers: {key}")
+    return key
 
 
-def calculate_manual_risk_score(input_data):
+def _result_dict(result):
+    """predict_stroke's response dict (with fresh lists) for an _explain result"""
+    prediction, probability_percent, reasons, recommendations = result
+    return {
+        'prediction': prediction,
+        'probability': probability_percent,
+        'reasons': list(reasons),
+        'recommendations': list(recommendations)
+    }
+
+
+def _error_result():
+    return {
+        'prediction': -1,
+        'probability': 0,
+        'reasons': ['Error in prediction'],
+        'recommendations': ['Please try again or contact support']
+    }
+
+
+@lru_cache(maxsize=16384)
+def _predict_cached(input_data):
+    """
+    Run the model and build the explanation for one (rounded) input tuple
+    Returns: (prediction, probability_percent, reasons, recommendations)
+    """
+    # Preprocess input
+    processed_data = model_input(input_data)
+
+    # Get probability for stroke class (class = 1)
+    if _batcher is not None:
+        proba = _batcher.submit(processed_data)[1]
+    else:
+        proba = model_predict_proba(processed_data)[0][1]
+
+    return _explain(input_data, proba)
+
+
+def _explain(input_data, proba):
+    """
+    Apply the manual risk adjustment and threshold to the model probability
+    and build the explanation for one input tuple
+    Returns: (prediction, probability_percent, reasons, recommendations)
+    """
+    # Classify the inputs once for the manual score and both explanations
+    flags = _derive_flags(input_data)
+
+    # Calculate manual risk score as a safety check
+    manual_risk_score = calculate_manual_risk_score(flags)
+    
+    # Adjust probability if manual risk score suggests higher risk
+    # This helps when the model underestimates risk
+    if manual_risk_score > proba:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("\nManual risk score (%.3f) higher than model (%.3f)", manual_risk_score, proba)
+        proba = (proba + manual_risk_score) / 2  # Average them
+    
+    # Percentage to 2 decimals; proba >= 0, so +0.5 and truncation rounds half up
+    probability_percent = int(float(proba) * 10000 + 0.5) / 100.0
+
+    # Medical-safe threshold
+    prediction = 1 if proba >= 0.3 else 0
+
+    # Generate risk factors explanation
+    reasons = generate_risk_factors(flags, proba)
+    
+    # Generate personalized recommendations
+    recommendations = generate_recommendations(flags, proba)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("\nStroke probability: %.3f, prediction (0=Low, 1=High): %s", proba, prediction)
+
+    return prediction, probability_percent, tuple(reasons), tuple(recommendations)
+
+
+# ---------------- SHARED INPUT FLAGS ----------------
+class RiskFlags(NamedTuple):
+    # Raw values shown in the explanations
+    age: float
+    avg_glucose_level: float
+    bmi: float
+    # 0/1 flags and the smoking code
+    male: int
+    hypertension: int
+    heart_disease: int
+    smoking_status: int
+    score_age_band: int  # _AGE_BINS band (manual score)
+    age_band: int  # _AGE_REASON_BINS band (explanations)
+    glucose_band: int  # _GLUCOSE_BINS band: normal, pre-diabetes, diabetes, uncontrolled
+    bmi_band: int  # _BMI_BINS band: normal, overweight, obese, severely obese
+    major_factors: int  # count of major risk factors
+
+
+def _derive_flags(input_data: Sequence[float]) -> RiskFlags:
+    """
+    Classify one input once for calculate_manual_risk_score,
+    generate_risk_factors and generate_recommendations
+    input_data order: gender, age, hypertension, heart_disease, ever_married, 
+                      work_type, Residence_type, avg_glucose_level, bmi, smoking_status
+    """
+    gender, age, hypertension, heart_disease, ever_married, work_type, \
+    residence_type, avg_glucose_level, bmi, smoking_status = input_data
+
+    hypertension = int(hypertension == 1)
+    heart_disease = int(heart_disease == 1)
+    score_age_band = bisect_right(_AGE_BINS, age)
+    glucose_band = bisect_right(_GLUCOSE_BINS, avg_glucose_level)
+    bmi_band = bisect_right(_BMI_BINS, bmi)
+
+    major_factors = (hypertension + heart_disease +
+                     int(glucose_band >= 2) +  # diabetes (126+)
+                     int(bmi_band >= 2) +  # obese (30+)
+                     int(smoking_status == 3) +
+                     int(score_age_band >= 3))  # 55+
+
+    return RiskFlags(
+        age, avg_glucose_level, bmi,
+        int(gender == 1), hypertension, heart_disease, int(smoking_status),
+        score_age_band, bisect_right(_AGE_REASON_BINS, age),
+        glucose_band, bmi_band, major_factors,
+    )
+
+
+# ---------------- MANUAL RISK SCORE TABLES ----------------
+# bisect_right(BINS, value) is the band a value falls in; POINTS[band] is
+# what that band adds to the score. E.g. age 70 -> band 4 (65-74) -> +0.25
+_AGE_BINS = (35, 45, 55, 65, 75)
+_AGE_POINTS = (0.01, 0.03, 0.08, 0.15, 0.25, 0.35)
+_GLUCOSE_BINS = (100, 126, 200)  # pre-diabetes, diabetes, uncontrolled
+_GLUCOSE_POINTS = (0.0, 0.08, 0.15, 0.20)
+_BMI_BINS = (25, 30, 35)  # overweight, obese, severely obese
+_BMI_POINTS = (0.0, 0.05, 0.10, 0.15)
+_SMOKING_POINTS = {3: 0.20, 1: 0.08}  # currently smokes, formerly smoked
+_COMPOUND_POINTS = (0.0, 0.0, 0.05, 0.10)  # by number of major factors (capped at 3)
+
+
+def calculate_manual_risk_score(flags: RiskFlags) -> float:
     """
     Calculate a manual risk score based on known risk factors
     This serves as a safety check when the ML model underestimates risk
+    flags: _derive_flags(input_data)
     Returns a score between 0 and 1
     """
-    gender, age, hypertension, heart_disease, ever_married, work_type, \
-    residence_type, avg_glucose_level, bmi, smoking_status = input_data
-    
-    risk_score = 0.0
-    
     # Age is the strongest predictor
-    if age >= 75:
-        risk_score += 0.35
-    elif age >= 65:
-        risk_score += 0.25
-    elif age >= 55:
-        risk_score += 0.15
-    elif age >= 45:
-        risk_score += 0.08
-    elif age >= 35:
-        risk_score += 0.03
-    else:
-        risk_score += 0.01
+    risk_score = _AGE_POINTS[flags.score_age_band]
     
-    # Hypertension - major risk factor
-    if hypertension == 1:
-        risk_score += 0.25
-    
-    # Heart disease - very serious
-    if heart_disease == 1:
-        risk_score += 0.30
+    # Hypertension - major risk factor; heart disease - very serious
+    risk_score += 0.25 * flags.hypertension
+    risk_score += 0.30 * flags.heart_disease
     
     # Glucose level - diabetes is serious
-    if avg_glucose_level >= 200:
-        risk_score += 0.20
-    elif avg_glucose_level >= 126:  # Diabetes threshold
-        risk_score += 0.15
-    elif avg_glucose_level >= 100:  # Pre-diabetes
-        risk_score += 0.08
+    risk_score += _GLUCOSE_POINTS[flags.glucose_band]
     
     # BMI
-    if bmi >= 35:
-        risk_score += 0.15
-    elif bmi >= 30:
-        risk_score += 0.10
-    elif bmi >= 25:
-        risk_score += 0.05
+    risk_score += _BMI_POINTS[flags.bmi_band]
     
     # Smoking - very significant
-    if smoking_status == 3:  # Currently smokes
-        risk_score += 0.20
-    elif smoking_status == 1:  # Formerly smoked
-        risk_score += 0.08
+    risk_score += _SMOKING_POINTS.get(flags.smoking_status, 0.0)
     
     # Gender (males have slightly higher risk)
-    if gender == 1:
-        risk_score += 0.05
-    
-    # Multiple risk factors compound - add bonus if 3+ major factors present
-    major_factors = sum([
-        hypertension == 1,
-        heart_disease == 1,
-        avg_glucose_level >= 126,
-        bmi >= 30,
-        smoking_status == 3,
-        age >= 55
-    ])
+    risk_score += 0.05 * flags.male
     
-    if major_factors >= 3:
-        risk_score += 0.10  # Compound risk bonus
-    elif major_factors >= 2:
-        risk_score += 0.05
+    # Multiple risk factors compound - add bonus if 2+ major factors present
+    risk_score += _COMPOUND_POINTS[min(flags.major_factors, 3)]
     
     # Cap at 0.95 (never 100% certain)
-    risk_score = min(risk_score, 0.95)
-    
-    return risk_score
+    return min(risk_score, 0.95)
+
+
+# ---------------- EXPLANATION TABLES ----------------
+# Overall risk line, filled in with the probability as a percentage.
+# Probability tiers: low (< 0.3), moderate (0.3-0.6), high (0.6+); low risk
+# with any risk factor present is reported as low-moderate
+_RISK_TIER_BINS = (0.3, 0.6)
+_HIGH_RISK_REASON = "🚨 HIGH RISK: {:.1f}% probability - Immediate medical consultation recommended"
+_MODERATE_RISK_REASON = "⚠️ MODERATE RISK: {:.1f}% probability - Regular monitoring and lifestyle changes needed"
+_LOW_MODERATE_RISK_REASON = "⚡ LOW-MODERATE RISK: {:.1f}% probability - Address risk factors to prevent future complications"
+_LOW_RISK_REASON = "✓ LOW RISK: {:.1f}% probability - Continue healthy lifestyle"
+_RISK_TIER_REASONS = (_LOW_RISK_REASON, _MODERATE_RISK_REASON, _HIGH_RISK_REASON)
 
+# Age bands for the explanations: under 45, 45-59, 60+
+_AGE_REASON_BINS = (45, 60)
 
-def generate_risk_factors(input_data, probability):
+_AGE_REASONS = (
+    "✓ Age {} years - Lower risk group (under 45)",
+    "⚡ Age {} years - Moderate risk group (45-59 years)",
+    "⚠️ Age {} years - Higher risk group (60+ years)",
+)
+_HYPERTENSION_REASONS = ("✓ No hypertension detected", "⚠️ Hypertension present - Significant risk factor")
+_HEART_DISEASE_REASONS = ("✓ No heart disease detected", "⚠️ Heart disease present - Major risk factor")
+_GLUCOSE_REASONS = (  # indexed by _GLUCOSE_BINS band
+    "✓ Normal glucose level ({:.1f} mg/dL)",
+    "⚡ Elevated glucose level ({:.1f} mg/dL) - Pre-diabetes range",
+    "⚠️ High glucose level ({:.1f} mg/dL) - Diabetes indicator",
+    "🚨 Very high glucose level ({:.1f} mg/dL) - Uncontrolled diabetes",
+)
+_BMI_REASONS = (  # indexed by _BMI_BINS band
+    "✓ BMI {:.1f} - Normal weight range",
+    "⚡ BMI {:.1f} - Overweight (moderate risk)",
+    "⚠️ BMI {:.1f} - Obesity (increased risk)",
+    "🚨 BMI {:.1f} - Severe obesity (high risk)",
+)
+_SMOKING_REASONS = {
+    3: "⚠️ Current smoker - Significant risk factor",
+    1: "⚡ Former smoker - Reduced but present risk",
+    2: "✓ Never smoked - Lower risk",
+}
+_SMOKING_UNKNOWN_REASON = "⚡ Smoking status unknown"
+
+_CONSULT_RECS = ("Schedule an appointment with a healthcare provider for comprehensive evaluation",)
+_HYPERTENSION_RECS = (
+    "Monitor blood pressure daily and maintain a log",
+    "Reduce sodium intake to less than 2,300mg per day",
+    "Take prescribed blood pressure medications as directed",
+    "Aim for blood pressure below 120/80 mmHg",
+)
+_HEART_DISEASE_RECS = (
+    "Follow your cardiologist's treatment plan strictly",
+    "Keep emergency contact numbers readily available",
+    "Avoid strenuous activities without medical clearance",
+    "Take cardiac medications exactly as prescribed",
+)
+_DIABETES_RECS = (
+    "Consult an endocrinologist for diabetes management immediately",
+    "Monitor blood sugar levels at least twice daily",
+    "Follow a diabetic-friendly diet plan (low glycemic index foods)",
+    "Get HbA1c test every 3 months to track diabetes control",
+)
+_PRE_DIABETES_RECS = (
+    "Get HbA1c test to check for pre-diabetes",
+    "Reduce sugar and refined carbohydrate intake",
+    "Increase fiber intake with whole grains and vegetables",
+)
+_GLUCOSE_RECS = ((), _PRE_DIABETES_RECS, _DIABETES_RECS, _DIABETES_RECS)  # by _GLUCOSE_BINS band
+_OBESITY_RECS = (
+    "Work with a nutritionist to develop a structured weight loss plan",
+    "Start with low-impact exercises like walking 30 minutes daily",
+    "Aim to lose 5-10% of body weight to significantly reduce stroke risk",
+    "Track daily calorie intake and maintain a food diary",
+)
+_OVERWEIGHT_RECS = (
+    "Maintain a balanced diet with portion control",
+    "Incorporate 150 minutes of moderate exercise weekly",
+    "Focus on whole foods and limit processed foods",
+)
+_BMI_RECS = ((), _OVERWEIGHT_RECS, _OBESITY_RECS, _OBESITY_RECS)  # by _BMI_BINS band
+_SMOKING_RECS = {
+    3: (  # Currently smokes
+        "URGENT: Quit smoking immediately - single most important change you can make",
+        "Consider nicotine replacement therapy or prescription medications",
+        "Join a smoking cessation program for support",
+        "Avoid triggers and secondhand smoke exposure",
+    ),
+    1: (  # Formerly smoked
+        "Congratulations on quitting smoking - continue to stay tobacco-free",
+        "Avoid environments with secondhand smoke",
+    ),
+}
+_AGE_RECS = (  # by _AGE_REASON_BINS band
+    (),
+    ("Annual comprehensive health check-ups recommended",),
+    ("Schedule health screenings every 6 months due to age-related risk",
+     "Consider joining senior wellness programs"),
+)
+_YOUNG_WITH_RISKS_RECS = ("Young age is protective, but address risk factors now to prevent future complications",)
+_LIFESTYLE_RECS = (
+    "Adopt a Mediterranean-style diet rich in fruits, vegetables, and whole grains",
+    "Limit alcohol consumption (max 1-2 drinks per day)",
+    "Manage stress through meditation, yoga, or counseling",
+    "Ensure 7-8 hours of quality sleep nightly",
+    "Learn stroke warning signs: F.A.S.T. (Face drooping, Arm weakness, Speech difficulty, Time to call emergency)",
+)
+_LOW_RISK_RECS = (
+    "Continue maintaining your healthy lifestyle",
+    "Regular exercise and balanced diet are key to prevention",
+    "Schedule routine health check-ups annually",
+    "Stay informed about stroke prevention",
+)
+_DEFAULT_RECS = (
+    "Maintain a healthy lifestyle with regular exercise and balanced diet",
+    "Schedule regular health check-ups",
+)
+
+
+def generate_risk_factors(flags: RiskFlags, probability: float) -> list[str]:
     """
     Generate human-readable risk factors based on input data
-    input_data order: gender, age, hypertension, heart_disease, ever_married, 
-                      work_type, Residence_type, avg_glucose_level, bmi, smoking_status
+    flags: _derive_flags(input_data)
     """
-    reasons = []
-    
-    # Unpack input data
-    gender, age, hypertension, heart_disease, ever_married, work_type, \
-    residence_type, avg_glucose_level, bmi, smoking_status = input_data
-    
     # Overall risk assessment - more nuanced
-    if probability >= 0.6:
-        reasons.append(f"🚨 HIGH RISK: {probability*100:.1f}% probability - Immediate medical consultation recommended")
-    elif probability >= 0.3:
-        reasons.append(f"⚠️ MODERATE RISK: {probability*100:.1f}% probability - Regular monitoring and lifestyle changes needed")
-    else:
-        # Check if there are risk factors even with low probability
-        has_risk_factors = (hypertension == 1 or heart_disease == 1 or 
-                           avg_glucose_level >= 100 or bmi >= 25 or smoking_status in [1, 3])
-        if has_risk_factors:
-            reasons.append(f"⚡ LOW-MODERATE RISK: {probability*100:.1f}% probability - Address risk factors to prevent future complications")
-        else:
-            reasons.append(f"✓ LOW RISK: {probability*100:.1f}% probability - Continue healthy lifestyle")
-    
-    # Age analysis (most important factor)
-    if age >= 60:
-        reasons.append(f"⚠️ Age {int(age)} years - Higher risk group (60+ years)")
-    elif age >= 45:
-        reasons.append(f"⚡ Age {int(age)} years - Moderate risk group (45-59 years)")
-    else:
-        reasons.append(f"✓ Age {int(age)} years - Lower risk group (under 45)")
-    
-    # Hypertension
-    if hypertension == 1:
-        reasons.append("⚠️ Hypertension present - Significant risk factor")
-    else:
-        reasons.append("✓ No hypertension detected")
-    
-    # Heart disease
-    if heart_disease == 1:
-        reasons.append("⚠️ Heart disease present - Major risk factor")
-    else:
-        reasons.append("✓ No heart disease detected")
-    
-    # Glucose level
-    if avg_glucose_level >= 200:
-        reasons.append(f"🚨 Very high glucose level ({avg_glucose_level:.1f} mg/dL) - Uncontrolled diabetes")
-    elif avg_glucose_level >= 126:
-        reasons.append(f"⚠️ High glucose level ({avg_glucose_level:.1f} mg/dL) - Diabetes indicator")
-    elif avg_glucose_level >= 100:
-        reasons.append(f"⚡ Elevated glucose level ({avg_glucose_level:.1f} mg/dL) - Pre-diabetes range")
-    else:
-        reasons.append(f"✓ Normal glucose level ({avg_glucose_level:.1f} mg/dL)")
-    
-    # BMI
-    if bmi >= 35:
-        reasons.append(f"🚨 BMI {bmi:.1f} - Severe obesity (high risk)")
-    elif bmi >= 30:
-        reasons.append(f"⚠️ BMI {bmi:.1f} - Obesity (increased risk)")
-    elif bmi >= 25:
-        reasons.append(f"⚡ BMI {bmi:.1f} - Overweight (moderate risk)")
-    else:
-        reasons.append(f"✓ BMI {bmi:.1f} - Normal weight range")
-    
-    # Smoking status
-    if smoking_status == 3:
-        reasons.append("⚠️ Current smoker - Significant risk factor")
-    elif smoking_status == 1:
-        reasons.append("⚡ Former smoker - Reduced but present risk")
-    elif smoking_status == 2:
-        reasons.append("✓ Never smoked - Lower risk")
-    else:
-        reasons.append("⚡ Smoking status unknown")
+    tier = bisect_right(_RISK_TIER_BINS, probability)
+    overall = _RISK_TIER_REASONS[tier]
+    # Check if there are risk factors even with low probability
+    if tier == 0 and (flags.hypertension or flags.heart_disease or flags.glucose_band >= 1 or
+                      flags.bmi_band >= 1 or flags.smoking_status in (1, 3)):
+        overall = _LOW_MODERATE_RISK_REASON
+    
+    reasons = [overall.format(probability * 100)]
+    
+    reasons.append(_AGE_REASONS[flags.age_band].format(int(flags.age)))
+    reasons.append(_HYPERTENSION_REASONS[flags.hypertension])
+    reasons.append(_HEART_DISEASE_REASONS[flags.heart_disease])
+    reasons.append(_GLUCOSE_REASONS[flags.glucose_band].format(flags.avg_glucose_level))
+    reasons.append(_BMI_REASONS[flags.bmi_band].format(flags.bmi))
+    reasons.append(_SMOKING_REASONS.get(flags.smoking_status, _SMOKING_UNKNOWN_REASON))
     
     return reasons
 
 
-def generate_recommendations(input_data, probability):
+def generate_recommendations(flags: RiskFlags, probability: float) -> list[str]:
     """
     Generate personalized recommendations based on specific risk factors
-    input_data order: gender, age, hypertension, heart_disease, ever_married, 
-                      work_type, Residence_type, avg_glucose_level, bmi, smoking_status
+    flags: _derive_flags(input_data)
     """
-    recommendations = []
+    # Major risk factors (age aside)
+    has_major_risks = (flags.hypertension or flags.heart_disease or flags.glucose_band >= 2 or
+                       flags.bmi_band >= 2 or flags.smoking_status == 3)
     
-    # Unpack input data
-    gender, age, hypertension, heart_disease, ever_married, work_type, \
-    residence_type, avg_glucose_level, bmi, smoking_status = input_data
-    
-    # Count major risk factors
-    has_major_risks = (hypertension == 1 or heart_disease == 1 or 
-                       avg_glucose_level >= 126 or bmi >= 30 or smoking_status == 3)
+    recommendations: list[str] = []
     
     # High risk or multiple risk factors - urgent actions first
     if probability >= 0.5 or has_major_risks:
-        recommendations.append("Schedule an appointment with a healthcare provider for comprehensive evaluation")
-    
-    # Hypertension recommendations
-    if hypertension == 1:
-        recommendations.append("Monitor blood pressure daily and maintain a log")
-        recommendations.append("Reduce sodium intake to less than 2,300mg per day")
-        recommendations.append("Take prescribed blood pressure medications as directed")
-        recommendations.append("Aim for blood pressure below 120/80 mmHg")
-    
-    # Heart disease recommendations
-    if heart_disease == 1:
-        recommendations.append("Follow your cardiologist's treatment plan strictly")
-        recommendations.append("Keep emergency contact numbers readily available")
-        recommendations.append("Avoid strenuous activities without medical clearance")
-        recommendations.append("Take cardiac medications exactly as prescribed")
-    
-    # Glucose recommendations
-    if avg_glucose_level >= 126:
-        recommendations.append("Consult an endocrinologist for diabetes management immediately")
-        recommendations.append("Monitor blood sugar levels at least twice daily")
-        recommendations.append("Follow a diabetic-friendly diet plan (low glycemic index foods)")
-        recommendations.append("Get HbA1c test every 3 months to track diabetes control")
-    elif avg_glucose_level >= 100:
-        recommendations.append("Get HbA1c test to check for pre-diabetes")
-        recommendations.append("Reduce sugar and refined carbohydrate intake")
-        recommendations.append("Increase fiber intake with whole grains and vegetables")
-    
-    # BMI recommendations
-    if bmi >= 30:
-        recommendations.append("Work with a nutritionist to develop a structured weight loss plan")
-        recommendations.append("Start with low-impact exercises like walking 30 minutes daily")
-        recommendations.append("Aim to lose 5-10% of body weight to significantly reduce stroke risk")
-        recommendations.append("Track daily calorie intake and maintain a food diary")
-    elif bmi >= 25:
-        recommendations.append("Maintain a balanced diet with portion control")
-        recommendations.append("Incorporate 150 minutes of moderate exercise weekly")
-        recommendations.append("Focus on whole foods and limit processed foods")
+        recommendations.extend(_CONSULT_RECS)
     
-    # Smoking recommendations
-    if smoking_status == 3:  # Currently smokes
-        recommendations.append("URGENT: Quit smoking immediately - single most important change you can make")
-        recommendations.append("Consider nicotine replacement therapy or prescription medications")
-        recommendations.append("Join a smoking cessation program for support")
-        recommendations.append("Avoid triggers and secondhand smoke exposure")
-    elif smoking_status == 1:  # Formerly smoked
-        recommendations.append("Congratulations on quitting smoking - continue to stay tobacco-free")
-        recommendations.append("Avoid environments with secondhand smoke")
+    if flags.hypertension:
+        recommendations.extend(_HYPERTENSION_RECS)
+    if flags.heart_disease:
+        recommendations.extend(_HEART_DISEASE_RECS)
+    recommendations.extend(_GLUCOSE_RECS[flags.glucose_band])
+    recommendations.extend(_BMI_RECS[flags.bmi_band])
+    recommendations.extend(_SMOKING_RECS.get(flags.smoking_status, ()))
     
     # Age-specific recommendations
-    if age >= 60:
-        recommendations.append("Schedule health screenings every 6 months due to age-related risk")
-        recommendations.append("Consider joining senior wellness programs")
-    elif age >= 45:
-        recommendations.append("Annual comprehensive health check-ups recommended")
-    elif age < 45 and has_major_risks:
-        recommendations.append("Young age is protective, but address risk factors now to prevent future complications")
+    recommendations.extend(_AGE_RECS[flags.age_band])
+    if flags.age_band == 0 and has_major_risks:
+        recommendations.extend(_YOUNG_WITH_RISKS_RECS)
     
     # General lifestyle for those with risk factors
     if has_major_risks or probability >= 0.3:
-        recommendations.append("Adopt a Mediterranean-style diet rich in fruits, vegetables, and whole grains")
-        recommendations.append("Limit alcohol consumption (max 1-2 drinks per day)")
-        recommendations.append("Manage stress through meditation, yoga, or counseling")
-        recommendations.append("Ensure 7-8 hours of quality sleep nightly")
-        recommendations.append("Learn stroke warning signs: F.A.S.T. (Face drooping, Arm weakness, Speech difficulty, Time to call emergency)")
+        recommendations.extend(_LIFESTYLE_RECS)
     
     # Low risk maintenance - only if truly low risk
     if probability < 0.3 and not has_major_risks:
-        recommendations.append("Continue maintaining your healthy lifestyle")
-        recommendations.append("Regular exercise and balanced diet are key to prevention")
-        recommendations.append("Schedule routine health check-ups annually")
-        recommendations.append("Stay informed about stroke prevention")
+        recommendations.extend(_LOW_RISK_RECS)
     
     # If no recommendations yet (shouldn't happen), add default
     if len(recommendations) == 0:
-        recommendations.append("Maintain a healthy lifestyle with regular exercise and balanced diet")
-        recommendations.append("Schedule regular health check-ups")
+        recommendations.extend(_DEFAULT_RECS)
     
     return recommendations
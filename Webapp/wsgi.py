@@ -0,0 +1,8 @@
+"""
+WSGI entry point for production servers
+Run from the Webapp folder: gunicorn wsgi:app
+"""
+from app import app
+
+if __name__ == "__main__":
+    app.run()